@@ -1,5 +1,6 @@
 import argparse
 import functools
+import hashlib
 import logging
 import math
 import os
@@ -13,7 +14,12 @@ import markdown
 import yaml
 
 from core.extensions import get_jinja2_env
-from core.util import dict_merge, find_working_ext, get_first, transactional
+from core.styles import (
+    COMPILED_SUFFIX, STYLESHEET_EXTENSIONS, StylesheetError,
+    find_compiler, process_header, process_stylesheet,
+    stylesheet_dependencies, stylesheet_fingerprint,
+)
+from core.util import DictMerger, find_working_ext, get_first, transactional
 
 log = logging.getLogger(__name__)
 
@@ -31,6 +37,12 @@ class MissingDependency(DeckError):
     pass
 
 
+@functools.lru_cache()
+def _full_deck_template():
+    with open(FULL_DECK_TEMPLATE) as tf:
+        return jinja2.Template(tf.read())
+
+
 class _SourceFile:
     def __init__(self, path):
         self.path = os.path.abspath(path)
@@ -75,6 +87,7 @@ def sanitize_version(version, default=(0, 1, 0)):
 class _Card(dict):
     def __init__(self, id, defaults={}, data={}):
         self.id = id
+        data = {**data}  # data may be shared with the definitions cache
         self.copies = sanitize_copies(data.pop('copies', None), defaults.get('copies'))
         self.version = sanitize_version(data.pop('version', None), defaults.get('version'))
         super().__init__({**defaults, **data})
@@ -90,13 +103,37 @@ class _Card(dict):
             return False
 
 
-def _parse_definitions(path, *child_paths):
+_merge_extends = DictMerger(ignore_keys={'extends'})
+
+# path -> (mtime, definitions)
+_definitions_cache = {}
+# path -> (signature, merged definitions); signature is the chain of (path, mtime) pairs
+_merged_cache = {}
+
+
+def _load_definitions(path):
+    mtime = os.path.getmtime(path)
+    cached = _definitions_cache.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1], mtime
     with open(path) as yf:
         definitions = yaml.safe_load(yf)
     if not isinstance(definitions, dict):
         raise DeckError(f"Invalid Deck Definition: {path!r} (file must be a YAML dictionary)")
+    _definitions_cache[path] = mtime, definitions
+    return definitions, mtime
+
+
+def _parse_definitions(path, *child_paths):
+    """Returns the merged definitions, the paths of all ancestors, and the cache signature.
+
+    Merged results are memoized per file, so only the part of the hierarchy at or below
+    an edited file gets re-merged. The returned definitions are shared; do not mutate them.
+    """
+    path = os.path.abspath(path)
+    definitions, mtime = _load_definitions(path)
     if 'extends' in definitions:
-        parent_path = os.path.join(os.path.dirname(path), definitions['extends'])
+        parent_path = os.path.abspath(os.path.join(os.path.dirname(path), definitions['extends']))
         if os.path.samefile(parent_path, path):
             raise CyclicDependency(
                 f"{path!r} wants to extend {parent_path!r}, but they are the same file"
@@ -108,21 +145,30 @@ def _parse_definitions(path, *child_paths):
                     f" but {parent_path!r} already directly or indirectly extends {path!r}"
                 )
         try:
-            parent_defs, parent_deps = _parse_definitions(parent_path, path, *child_paths)
+            parent_defs, parent_deps, parent_signature = _parse_definitions(
+                parent_path, path, *child_paths
+            )
         except FileNotFoundError:
             raise MissingDependency(parent_path)
         else:
-            return (
-                dict_merge(parent_defs, definitions, ignore_keys={'extends'}),
-                [parent_path, *parent_deps]
-            )
+            signature = ((path, mtime), *parent_signature)
+            cached = _merged_cache.get(path)
+            if cached and cached[0] == signature:
+                merged = cached[1]
+            else:
+                merged = _merge_extends(parent_defs, definitions)
+                _merged_cache[path] = signature, merged
+            return merged, [parent_path, *parent_deps], signature
     else:
-        return definitions, []
+        return definitions, [], ((path, mtime),)
 
 
 class Deck:
     def __init__(self, source):
         self.source = _SourceFile(source)
+        self._rendered_cards = None
+        self._style_fingerprint = None
+        self._compiled_digest = None
 
         self._interpret_source()
 
@@ -130,7 +176,7 @@ class Deck:
     def _interpret_source(self):
         self.sub_sources = {}
 
-        deck_info, deps = _parse_definitions(self.source.path)
+        deck_info, deps, _ = _parse_definitions(self.source.path)
         self.hierarchy = [_SourceFile(path) for path in deps]
 
         self.title = deck_info.get('title')
@@ -149,13 +195,16 @@ class Deck:
             (['card_spacing', 'spacing'], '2pt'),
             (['embed_styles', 'embed_css'], True),
             (['markdown', 'md_config', 'md', 'md_conf', 'markdown_config'], {}),
+            (['minify_css', 'minify_styles', 'minify'], True),
+            (['css_compiler', 'style_compiler', 'preprocessor'], None),
         ]:
             setattr(self, attr, get_first(general, attr, *aliases, default=default))
 
-        self._sub_source(  # TODO: support for LESS, Stylus, SCSS, etc...
+        self._sub_source(
             general,
             'stylesheet', 'styles', 'css', 'style',
-            default=(self.source.base + '.css'),
+            default=self.source.base,
+            extensions=STYLESHEET_EXTENSIONS,
         )
         self._sub_source(
             general,
@@ -170,7 +219,8 @@ class Deck:
             extensions=['.html.jinja2', '.jinja2', '.hj2', '.vct']
         )
 
-        defaults = deck_info.get('default', {})
+        # deck_info is shared with the definitions cache, so copy before modifying
+        defaults = {**deck_info.get('default', {})}
         defaults['copies'] = sanitize_copies(defaults.get('copies'), 1)
         defaults['version'] = sanitize_version(defaults.get('version'), (0, 1, 0))
 
@@ -250,21 +300,27 @@ class Deck:
             rendered_cards += [rendered] * card.copies
 
         log.info("Rendered %d total cards", len(rendered_cards))
+        self._rendered_cards = rendered_cards
 
-        if self.header:
-            with open(self.header.path) as f:
-                custom_header = f.read()
-        else:
-            custom_header = None
+        self.render_page()
+
+    def render_page(self):
+        """Writes the output page, reusing the cards from the last render()."""
+        if self._rendered_cards is None:
+            return self.render()
 
-        with open(FULL_DECK_TEMPLATE) as tf:
-            global_template = env.from_string(tf.read())
+        try:
+            custom_header = process_header(self.header.path) if self.header else None
+            embedded_styles, stylesheet = self._process_styles()
+        except StylesheetError as err:
+            raise DeckError(*err.args) from err
 
         with open(self.output, "w") as of:
             of.write(
-                global_template.render(
-                    rendered_cards=rendered_cards,
-                    stylesheet=self.stylesheet.path,
+                _full_deck_template().render(
+                    rendered_cards=self._rendered_cards,
+                    stylesheet=stylesheet,
+                    embedded_styles=embedded_styles,
                     custom_header=custom_header,
                     absolute_to_relative=os.path.relpath(
                         os.path.dirname(self.output),
@@ -276,20 +332,73 @@ class Deck:
                 )
             )
 
+    def _process_styles(self):
+        """Returns the styles to embed and the stylesheet to link to (only one is used)."""
+        if not self.stylesheet:
+            return None, None
+        path = self.stylesheet.path
+        self._style_fingerprint = stylesheet_fingerprint(path, self.css_compiler)
+        if self.embed_styles:
+            css = process_stylesheet(
+                path, self.css_compiler,
+                minify=self.minify_css,
+                indent=12
+            )
+            return css, path
+        if not find_compiler(path, self.css_compiler):
+            return None, path
+
+        # Browsers can't read preprocessor sources, so link to the compiled output instead
+        css = process_stylesheet(path, self.css_compiler, minify=self.minify_css)
+        compiled_path = os.path.splitext(self.output)[0] + COMPILED_SUFFIX
+        digest = hashlib.sha1(css.encode()).hexdigest()
+        try:
+            # The mtime catches the file being deleted or changed by something else
+            written = compiled_path, digest, os.path.getmtime(compiled_path)
+        except OSError:
+            written = None
+        if written is None or written != self._compiled_digest:
+            with open(compiled_path, 'w') as cf:
+                cf.write(css)
+            self._compiled_digest = compiled_path, digest, os.path.getmtime(compiled_path)
+        return None, os.path.relpath(compiled_path, os.path.dirname(self.output))
+
+    def style_dependencies(self):
+        """Returns the stylesheet and, if it is compiled, every stylesheet it imports."""
+        if not self.stylesheet:
+            return []
+        return stylesheet_dependencies(self.stylesheet.path, self.css_compiler)
+
+    def _styles_changed(self):
+        return (
+            self.stylesheet is not None
+            and self._style_fingerprint is not None
+            and self._style_fingerprint != stylesheet_fingerprint(
+                self.stylesheet.path, self.css_compiler
+            )
+        )
+
     def sync(self):
         if self.source.refresh() or any(dep.refresh() for dep in self.hierarchy):
             self._interpret_source()
             self.render()
         else:
-            dirty = False
-            for dep in self.sub_sources.values():
-                dirty |= dep.refresh()
-            if dirty:
+            dirty = {name for name, dep in self.sub_sources.items() if dep.refresh()}
+            if self._styles_changed():
+                dirty.add('stylesheet')  # an imported stylesheet changed
+            if 'template' in dirty:
                 self.render()
+            elif dirty:
+                # Only styles or the header changed; the cards can be reused as-is
+                self.render_page()
 
     def is_dependency(self, path):
         return (
             path.endswith(self.source.name)
             or any(path.endswith(dep.name) for dep in self.hierarchy)
             or any(path.endswith(dep.name) for dep in self.sub_sources.values())
+            or any(
+                path.endswith(os.path.basename(dep))
+                for dep in self.style_dependencies()
+            )
         )
@@ -136,15 +136,15 @@ P_TAG = re.compile(r'</?p>')
 
 def get_jinja2_env(root, *, md_config, icon_path):
     # Configure markdown
-    md_extensions = md_config.get('extensions', ['smarty'])
     md_ext_conf = md_config.get('extension_configs', {})
-    md_extensions.append(
+    md_extensions = [
+        *md_config.get('extensions', ['smarty']),
         MarkdownExtensions(
             icon_root=icon_path,
             fs_root=root,
             **md_ext_conf.get('victorycard', {})
-        )
-    )
+        ),
+    ]
 
     # Configure Jinja2
     loader = jinja2.FileSystemLoader(root)
@@ -0,0 +1,247 @@
+import hashlib
+import logging
+import os
+import re
+import shlex
+import subprocess
+
+log = logging.getLogger(__name__)
+
+
+class StylesheetError(Exception):
+    pass
+
+
+# Default compilers for stylesheet preprocessors, by file extension.
+# '{path}' is replaced with the stylesheet path; if it is absent, the source is piped to stdin.
+# Add entries here (or set `css_compiler` in a deck's `general` section) to support others.
+PREPROCESSORS = {
+    '.less': ['lessc', '{path}'],
+    '.scss': ['sass', '{path}'],
+    '.sass': ['sass', '{path}'],
+    '.styl': ['stylus', '--print', '{path}'],
+}
+
+STYLESHEET_EXTENSIONS = ['.css', *PREPROCESSORS]
+
+# Suffix of compiled stylesheets written next to a deck's output
+COMPILED_SUFFIX = '.compiled.css'
+
+# (path, options) -> (mtime, digest)
+_digests = {}
+# digest -> processed text
+_outputs = {}
+# (path, options) -> (fingerprint, processed text), for compiled stylesheets
+_compiled = {}
+
+
+def find_compiler(path, compiler=None):
+    if compiler:
+        return shlex.split(compiler) if isinstance(compiler, str) else [*compiler]
+    return PREPROCESSORS.get(os.path.splitext(path)[1].lower())
+
+
+def run_compiler(command, path, source):
+    uses_path = any('{path}' in arg for arg in command)
+    args = [arg.replace('{path}', path) for arg in command]
+    try:
+        proc = subprocess.run(
+            args,
+            input=None if uses_path else source,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            cwd=os.path.dirname(path),
+            universal_newlines=True,
+            check=True,
+        )
+    except FileNotFoundError:
+        raise StylesheetError(
+            f"Stylesheet compiler {args[0]!r} is not installed (needed for {path!r})"
+        )
+    except subprocess.CalledProcessError as err:
+        raise StylesheetError(f"Could not compile {path!r}: {err.stderr.strip()}")
+    return proc.stdout
+
+
+_CSS_TOKENS = re.compile(
+    r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')'''  # strings are kept verbatim
+    r'|(\\(?:[0-9a-fA-F]{1,6}\s?|.))'  # so are escapes, including a hex escape's terminating space
+    r'|\s*(?:/\*.*?\*/\s*)+'  # runs of comments, with the whitespace around them
+    r'|\s*;\s*(})\s*'  # the last semicolon in a block is redundant
+    r'|\s*([{};,>])\s*'
+    r'|(\s+)',
+    re.S
+)
+_CSS_SEPARATORS = '{};,>'
+
+def _minify_token(m):
+    string, escape, close, punct, space = m.groups()
+    if string or escape:
+        return string or escape
+    elif close:
+        return close
+    elif punct:
+        return punct
+    elif space:
+        return ' '
+
+    # A comment separates whatever is on either side of it, unless that is punctuation anyway
+    text, start, end = m.string, m.start(), m.end()
+    while start and text[start - 1].isspace():
+        start -= 1
+    before = text[start - 1] if start else ''
+    after = text[end] if end < len(text) else ''
+    return '' if before in _CSS_SEPARATORS or after in _CSS_SEPARATORS else ' '
+
+def minify_css(css):
+    r"""Strips comments and unnecessary whitespace from css.
+
+    >>> minify_css('a::after { content: ";}" ; }')
+    'a::after{content: ";}"}'
+    >>> minify_css('a/**/b{c:d}')
+    'a b{c:d}'
+    >>> minify_css('a /* c */ /* d */ b { x: y /* z */ ; }')
+    'a b{x: y}'
+    >>> minify_css(r'.foo\  {x:y} .a\, .b{x:y} .\31  a{x:y}')
+    '.foo\\ {x:y}.a\\, .b{x:y}.\\31  a{x:y}'
+    """
+    return _CSS_TOKENS.sub(_minify_token, css).strip()
+
+
+_IMPORT = re.compile(r'@(?:import|use|forward|require)\s+([^;{}\n]+)')
+_IMPORT_TARGET = re.compile(r'''url\(\s*["']?([^"')]+)|["']([^"']+)["']|([^\s,"']+)''')
+
+# path -> (mtime, paths of the stylesheets it imports)
+_imports = {}
+
+
+def _resolve_import(name, directory, ext):
+    if '://' in name or name.startswith('//') or ':' in name.split('/', 1)[0]:
+        return None  # remote file or built-in module (e.g. 'sass:math')
+    base = os.path.normpath(os.path.join(directory, name))
+    parent, stem = os.path.split(base)
+    candidates = [base]
+    for candidate_ext in dict.fromkeys([ext, *STYLESHEET_EXTENSIONS]):
+        candidates += [
+            base + candidate_ext,
+            os.path.join(parent, '_' + stem + candidate_ext),
+            os.path.join(base, 'index' + candidate_ext),
+            os.path.join(base, '_index' + candidate_ext),
+        ]
+    for candidate in candidates:
+        if os.path.isfile(candidate):
+            return candidate
+    return None
+
+
+def _find_imports(path):
+    mtime = os.path.getmtime(path)
+    cached = _imports.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with open(path) as f:
+        source = f.read()
+    directory = os.path.dirname(path)
+    ext = os.path.splitext(path)[1].lower()
+    found = []
+    for targets in _IMPORT.findall(source):
+        for target in _IMPORT_TARGET.findall(targets):
+            name = next(filter(None, target))
+            if name in ('as', 'with', 'show', 'hide'):
+                continue  # @use/@forward keywords
+            resolved = _resolve_import(name, directory, ext)
+            if resolved:
+                found.append(resolved)
+    _imports[path] = mtime, found
+    return found
+
+
+def stylesheet_dependencies(path, compiler=None):
+    """Returns the files a stylesheet depends on.
+
+    For compiled stylesheets, @import/@use/@forward/@require rules are followed recursively.
+    Imports that can't be found on disk (e.g. through the compiler's load paths) are skipped.
+    """
+    if not find_compiler(path, compiler):
+        return [path]
+    found = {}
+    pending = [path]
+    while pending:
+        dep = pending.pop()
+        if dep in found:
+            continue
+        try:
+            found[dep] = _find_imports(dep)
+        except OSError:
+            found[dep] = []
+            continue
+        pending += found[dep]
+    return sorted(found)
+
+
+def stylesheet_fingerprint(path, compiler=None):
+    return tuple(
+        (dep, os.path.getmtime(dep))
+        for dep in stylesheet_dependencies(path, compiler)
+    )
+
+
+def _cached(path, options, process):
+    """Runs process(path, text, *options), cached by file content hash.
+
+    Files whose mtime has not changed are not even read again.
+    """
+    key = path, options
+    mtime = os.path.getmtime(path)
+    known = _digests.get(key)
+    if known and known[0] == mtime and known[1] in _outputs:
+        return _outputs[known[1]]
+
+    with open(path, 'rb') as f:
+        content = f.read()
+    digest = hashlib.sha1(
+        repr((process.__name__, options)).encode() + b'\0' + content
+    ).hexdigest()
+    _digests[key] = mtime, digest
+    if digest not in _outputs:
+        log.debug("Processing %r", path)
+        if known:
+            _outputs.pop(known[1], None)
+        _outputs[digest] = process(path, content.decode(), *options)
+    return _outputs[digest]
+
+
+def _process_stylesheet(path, source, command, minify, indent):
+    css = run_compiler(command, path, source) if command else source
+    if minify:
+        return minify_css(css)
+    else:
+        return css.replace('\n', '\n' + ' ' * indent)
+
+
+def _read_text(path, text):
+    return text
+
+
+def process_stylesheet(path, compiler=None, *, minify=True, indent=0):
+    """Returns the stylesheet at path, compiled and minified (or indented), ready to embed."""
+    command = find_compiler(path, compiler)
+    options = tuple(command or ()), minify, indent
+    if not command:
+        return _cached(path, options, _process_stylesheet)
+
+    # The entry file's content says nothing about its imports, so go by their mtimes instead
+    key = path, options
+    fingerprint = stylesheet_fingerprint(path, compiler)
+    known = _compiled.get(key)
+    if known and known[0] == fingerprint:
+        return known[1]
+    log.debug("Compiling %r", path)
+    with open(path) as f:
+        css = _process_stylesheet(path, f.read(), *options)
+    _compiled[key] = fingerprint, css
+    return css
+
+
+def process_header(path):
+    return _cached(path, (), _read_text)
@@ -67,32 +67,81 @@ def find_working_ext(base, *extensions):
         return None
 
 
-def dict_merge(base, overrides, ignore_keys=()):
-    result = {}
-    for key in {*base, *overrides} - {key.split('.', 1)[0] for key in ignore_keys}:
-        if key not in overrides:
-            result[key] = base[key]
-            continue
-        elif key not in base:
-            result[key] = overrides[key]
-            continue
-
-        b_val = base[key]
-        o_val = overrides[key]
-        if isinstance(o_val, type(b_val)):
-            if isinstance(b_val, dict):
-                result[key] = dict_merge(
-                    b_val, o_val,
-                    {
-                        key.split('.', 1)[1]
-                        for key in ignore_keys
-                        if '.' in key
-                    }
-                )
-            elif isinstance(b_val, list):
-                result[key] = [*b_val, *o_val]
-            else:
-                result[key] = o_val
+def compile_ignore_keys(ignore_keys):
+    """Turns dotted ignore keys into a tree: None means "drop this key", a dict means "recurse"."""
+    compiled = {}
+    for key in ignore_keys:
+        node = compiled
+        *parents, leaf = key.split('.')
+        for part in parents:
+            child = node.get(part, {})
+            if child is None:
+                break  # An ancestor is already being dropped entirely
+            node = node.setdefault(part, child)
         else:
-            result[key] = o_val
-    return result
+            node[leaf] = None
+    return compiled
+
+
+class DictMerger:
+    """Deep-merges mappings, with the ignored keys compiled once up front.
+
+    Unchanged subtrees are shared with the inputs rather than copied, so the result
+    (and the inputs) must be treated as read-only.
+    """
+    __slots__ = '_ignored',
+
+    def __init__(self, ignore_keys=()):
+        self._ignored = compile_ignore_keys(ignore_keys)
+
+    def __call__(self, base, overrides):
+        return self._merge(base, overrides, self._ignored)
+
+    @classmethod
+    def _merge(cls, base, overrides, ignored):
+        if not ignored:
+            if not overrides:
+                return base
+            if not base:
+                return overrides
+
+        result = {}
+        for key in (*base, *(key for key in overrides if key not in base)):
+            sub_ignored = ignored.get(key, {})
+            if sub_ignored is None:
+                continue
+            if key not in overrides:
+                result[key] = cls._filter(base[key], sub_ignored)
+                continue
+            elif key not in base:
+                result[key] = cls._filter(overrides[key], sub_ignored)
+                continue
+
+            b_val = base[key]
+            o_val = overrides[key]
+            if isinstance(o_val, type(b_val)):
+                if isinstance(b_val, dict):
+                    result[key] = cls._merge(b_val, o_val, sub_ignored)
+                elif isinstance(b_val, list):
+                    if not o_val:
+                        result[key] = b_val
+                    elif not b_val:
+                        result[key] = o_val
+                    else:
+                        result[key] = b_val + o_val
+                else:
+                    result[key] = o_val
+            else:
+                result[key] = cls._filter(o_val, sub_ignored)
+        return result
+
+    @classmethod
+    def _filter(cls, value, ignored):
+        """Drops the ignored keys from a value that is not being merged with anything."""
+        if ignored and isinstance(value, dict):
+            return cls._merge(value, {}, ignored)
+        return value
+
+
+def dict_merge(base, overrides, ignore_keys=()):
+    return DictMerger(ignore_keys)(base, overrides)
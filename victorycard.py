@@ -119,12 +119,19 @@ def main():
                 except Exception:
                     log.exception("Cannot sync %r", deck.source.path)
 
+        def is_ignored(path):
+            return not any(deck.is_dependency(path) for deck in decks)
+
         server = livereload.Server()
-        server.watch(
-            f'{source_dir}/*',
-            sync,
-            ignore=lambda path: not any(deck.is_dependency(path) for deck in decks)
-        )
+        server.watch(f'{source_dir}/*', sync, ignore=is_ignored)
+        # Stylesheets can import files from other directories, so watch those too
+        style_dirs = {
+            os.path.dirname(dep)
+            for deck in decks
+            for dep in deck.style_dependencies()
+        }
+        for style_dir in style_dirs - {source_dir}:
+            server.watch(f'{style_dir}/*', sync, ignore=is_ignored)
         server.serve(
             root=source_dir,
             port=args.port,